@@ -18,93 +18,186 @@ from pathlib import Path
 from collections import defaultdict
 
 
+FASTQ_EXTENSIONS = ('.fastq.gz', '.fq.gz', '.fastq', '.fq')
+
+# Common paired-end naming schemes (_R1/_R2 with optional _001, _1/_2,
+# .R1/.R2 and .1/.2) combined into a single pattern; 'rest' is everything
+# after the mate token, i.e. the optional _001 and the extension
+PAIRED_PATTERN = re.compile(
+    r'^(?P<stem>.+?)(?P<sep>[._])(?P<mate>R?[12])(?P<rest>(?:_001)?\.f(?:ast)?q(?:\.gz)?)$'
+)
+
+
+def scan_fastq_files(input_dir):
+    """
+    Yield FASTQ file entries below a directory, following symlinks.
+    Entries are visited in sorted name order, and every directory reachable
+    through real paths is scanned before any symlinked one, so a directory
+    linked from elsewhere is always reported under its real path.
+    """
+    visited = set()
+    real_dirs = [input_dir]
+    linked_dirs = []
+    
+    while real_dirs or linked_dirs:
+        directory = real_dirs.pop() if real_dirs else linked_dirs.pop()
+        try:
+            # Skip directories already seen through another path
+            stat = os.stat(directory)
+            key = (stat.st_dev, stat.st_ino)
+            if key in visited:
+                continue
+            visited.add(key)
+            
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            # Missing or unreadable directories are skipped, as os.walk does
+            continue
+        
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=True):
+                subdirs.append(entry)
+            elif entry.name.endswith(FASTQ_EXTENSIONS):
+                yield entry
+        
+        # Pushed in reverse so subdirectories are popped in name order
+        for entry in reversed(subdirs):
+            (linked_dirs if entry.is_symlink() else real_dirs).append(entry.path)
+
+
 def find_fastq_files(input_dir, pattern=None):
     """Find all FASTQ files in a directory."""
-    fastq_extensions = ['.fastq.gz', '.fq.gz', '.fastq', '.fq']
-    fastq_files = []
+    regex = re.compile(pattern) if pattern is not None else None
+    # No global sort needed: scan_fastq_files sorts each directory's entries,
+    # so both the chosen paths and their order are deterministic, and
+    # parse_fastq_pairs sorts its output by sample name
+    return [
+        entry.path for entry in scan_fastq_files(input_dir)
+        if regex is None or regex.search(entry.name)
+    ]
+
+
+def match_mates(files1, files2, mate_key):
+    """
+    Pair R1 and R2 candidates that share the same mate_key.
+    Candidates are taken in sorted path order so the result does not depend
+    on input order. Returns (pairs, unmatched R1 files, unmatched R2 files).
+    """
+    candidates = defaultdict(list)
+    for file2 in sorted(files2):
+        candidates[mate_key(file2)].append(file2)
     
-    for root, dirs, files in os.walk(input_dir):
-        for file in files:
-            if any(file.endswith(ext) for ext in fastq_extensions):
-                if pattern is None or re.search(pattern, file):
-                    fastq_files.append(os.path.join(root, file))
+    pairs = []
+    unmatched1 = []
+    for file1 in sorted(files1):
+        files = candidates.get(mate_key(file1))
+        if files:
+            pairs.append((file1, files.pop(0)))
+        else:
+            unmatched1.append(file1)
     
-    return sorted(fastq_files)
+    unmatched2 = [file2 for files in candidates.values() for file2 in files]
+    return pairs, unmatched1, unmatched2
 
 
 def parse_fastq_pairs(fastq_files):
     """
     Parse FASTQ files and pair R1/R2 reads.
-    Returns dict: {sample_name: {'R1': path, 'R2': path or None}}
+    Returns parallel lists sorted by sample name: (names, r1_paths, r2_paths),
+    where r2_paths holds None for single-end samples. Samples with the same
+    name in different directories each get an entry, which nf-core/rnaseq
+    merges as runs of one sample.
     """
-    samples = defaultdict(dict)
-    
-    # Common paired-end patterns
-    paired_patterns = [
-        (r'(.+)_R1(_001)?\.f(ast)?q(\.gz)?$', r'(.+)_R2(_001)?\.f(ast)?q(\.gz)?$'),
-        (r'(.+)_1\.f(ast)?q(\.gz)?$', r'(.+)_2\.f(ast)?q(\.gz)?$'),
-        (r'(.+)\.R1\.f(ast)?q(\.gz)?$', r'(.+)\.R2\.f(ast)?q(\.gz)?$'),
-        (r'(.+)\.1\.f(ast)?q(\.gz)?$', r'(.+)\.2\.f(ast)?q(\.gz)?$'),
-    ]
+    names = []
+    r1s = []
+    r2s = []
     
-    # Try to match paired-end reads
-    remaining_files = set(fastq_files)
+    basenames = {file: os.path.basename(file) for file in fastq_files}
     
-    for r1_pattern, r2_pattern in paired_patterns:
-        matched_files = set()
-        
-        for file1 in remaining_files:
-            basename1 = os.path.basename(file1)
-            match1 = re.match(r1_pattern, basename1)
-            
-            if match1:
-                sample_name = match1.group(1)
-                # Look for corresponding R2
-                for file2 in remaining_files:
-                    basename2 = os.path.basename(file2)
-                    match2 = re.match(r2_pattern, basename2)
-                    
-                    if match2 and match2.group(1) == sample_name:
-                        samples[sample_name]['R1'] = file1
-                        samples[sample_name]['R2'] = file2
-                        matched_files.add(file1)
-                        matched_files.add(file2)
-                        break
-        
-        remaining_files -= matched_files
+    # Classify every file in one pass, bucketing R1 and R2 candidates by
+    # (stem, separator, 'R' prefix) so only matching naming styles are paired
+    r1_files = defaultdict(list)
+    r2_files = defaultdict(list)
+    rests = {}
+    for file in fastq_files:
+        match = PAIRED_PATTERN.match(basenames[file])
+        if match:
+            mate = match.group('mate')
+            key = (match.group('stem'), match.group('sep'), mate[:-1])
+            bucket = r1_files if mate[-1] == '1' else r2_files
+            bucket[key].append(file)
+            rests[file] = match.group('rest')
+    
+    # Pair mates within the same directory first, then pair leftovers across
+    # directories (e.g. R1/C_R1.fastq.gz with R2/C_R2.fastq.gz). At each level,
+    # mates whose names are identical apart from the mate token are preferred,
+    # so S_R1.fq.gz pairs with S_R2.fq.gz rather than S_R2.fastq.gz; pairing
+    # by position is the last resort. Anything still unmatched is single-end
+    pairing_keys = [
+        lambda file: (os.path.dirname(file), rests[file]),
+        os.path.dirname,
+        rests.get,
+        lambda file: None,
+    ]
+    matched_files = set()
+    for key, files1 in r1_files.items():
+        files2 = r2_files.get(key, [])
+        for mate_key in pairing_keys:
+            pairs, files1, files2 = match_mates(files1, files2, mate_key)
+            for file1, file2 in pairs:
+                names.append(key[0])
+                r1s.append(file1)
+                r2s.append(file2)
+                matched_files.add(file1)
+                matched_files.add(file2)
+    
+    remaining_files = [file for file in fastq_files if file not in matched_files]
     
     # Remaining files are single-end
     for file in remaining_files:
         # Extract sample name (remove extension)
-        basename = os.path.basename(file)
-        sample_name = re.sub(r'\.f(ast)?q(\.gz)?$', '', basename)
-        samples[sample_name]['R1'] = file
+        names.append(re.sub(r'\.f(ast)?q(\.gz)?$', '', basenames[file]))
+        r1s.append(file)
+        r2s.append(None)
     
-    return samples
+    if not names:
+        return [], [], []
+    
+    names, r1s, r2s = (list(column) for column in zip(*sorted(zip(names, r1s, r2s))))
+    return names, r1s, r2s
 
 
-def write_samplesheet(samples, output_file, strandedness='auto', s3_prefix=None):
+def write_samplesheet(names, r1s, r2s, output_file, strandedness='auto', s3_prefix=None):
     """Write samplesheet CSV for nf-core/rnaseq."""
-    with open(output_file, 'w') as f:
-        f.write('sample,fastq_1,fastq_2,strandedness\n')
+    rows = ['sample,fastq_1,fastq_2,strandedness\n']
+    
+    if s3_prefix:
+        local_prefix = s3_prefix['local']
+        local_len = len(local_prefix)
+        s3_path = s3_prefix['s3']
+    
+    for sample_name, r1, r2 in zip(names, r1s, r2s):
+        r2 = r2 or ''
         
-        for sample_name, reads in sorted(samples.items()):
-            r1 = reads.get('R1', '')
-            r2 = reads.get('R2', '')
-            
-            # Optionally convert to S3 paths
-            if s3_prefix:
-                r1 = r1.replace(s3_prefix['local'], s3_prefix['s3'])
-                if r2:
-                    r2 = r2.replace(s3_prefix['local'], s3_prefix['s3'])
-            
-            f.write(f'{sample_name},{r1},{r2},{strandedness}\n')
+        # Optionally convert to S3 paths by swapping the local prefix
+        if s3_prefix:
+            if r1.startswith(local_prefix):
+                r1 = s3_path + r1[local_len:]
+            if r2.startswith(local_prefix):
+                r2 = s3_path + r2[local_len:]
+        
+        rows.append(f'{sample_name},{r1},{r2},{strandedness}\n')
+    
+    with open(output_file, 'wb') as f:
+        f.write(''.join(rows).encode())
     
     print(f"Samplesheet written to: {output_file}")
-    print(f"Total samples: {len(samples)}")
-    paired = sum(1 for s in samples.values() if 'R2' in s)
+    print(f"Total samples: {len(names)}")
+    paired = sum(1 for r2 in r2s if r2 is not None)
     print(f"Paired-end: {paired}")
-    print(f"Single-end: {len(samples) - paired}")
+    print(f"Single-end: {len(names) - paired}")
 
 
 def main():
@@ -162,7 +255,7 @@ def main():
     print(f"Found {len(fastq_files)} FASTQ files")
     
     # Parse paired/single-end
-    samples = parse_fastq_pairs(fastq_files)
+    names, r1s, r2s = parse_fastq_pairs(fastq_files)
     
     # Setup S3 conversion if needed
     s3_prefix = None
@@ -173,7 +266,7 @@ def main():
         }
     
     # Write samplesheet
-    write_samplesheet(samples, args.output, args.strandedness, s3_prefix)
+    write_samplesheet(names, r1s, r2s, args.output, args.strandedness, s3_prefix)
 
 
 if __name__ == '__main__':